@@ -5,8 +5,11 @@ MongoDB connection module using motor async driver.
 import os
 
 import certifi
+from cachetools import LRUCache, TTLCache
 from dotenv import load_dotenv
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure
 from typing import Optional
 
 load_dotenv()
@@ -15,23 +18,52 @@ load_dotenv()
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
 DATABASE_NAME = os.getenv("MONGO_DB", "chat-room")
 
+# Single-field message indexes superseded by the (room_id, created_at) compound index
+LEGACY_MESSAGE_INDEXES = ("room_id_1", "created_at_1")
+INDEX_NOT_FOUND = 27  # MongoDB error code
+
 # Global client and database references
 client: Optional[AsyncIOMotorClient] = None
 db = None
 
+# In-process cache of known user documents, keyed by username. Users are
+# never deleted, so entries don't need invalidation.
+_user_cache: LRUCache = LRUCache(maxsize=50_000)
+
+# In-process cache of room membership info, keyed by room ObjectId.
+# Room-mutating routes call invalidate_room(); the TTL bounds staleness
+# across multiple worker processes.
+ROOM_CACHE_TTL_SECONDS = 30
+_room_cache: TTLCache = TTLCache(maxsize=10_000, ttl=ROOM_CACHE_TTL_SECONDS)
+# Bumped on every invalidation; a cache fill that started before an
+# invalidation must not store what may be a stale room.
+_room_cache_generation = 0
+
 
 async def connect_to_mongo():
     """Initialize MongoDB connection."""
     global client, db
     # Use certifi for SSL certificates (required for MongoDB Atlas on some platforms)
-    client = AsyncIOMotorClient(MONGO_URL, tlsCAFile=certifi.where())
+    # tz_aware: datetimes come back as UTC-aware, matching what we store
+    client = AsyncIOMotorClient(MONGO_URL, tz_aware=True, tlsCAFile=certifi.where())
     db = client[DATABASE_NAME]
 
     # Create indexes for better query performance
     await db.users.create_index("username", unique=True)
     await db.rooms.create_index("participant_usernames")
-    await db.messages.create_index("room_id")
-    await db.messages.create_index("created_at")
+    # Serves get_messages' room_id filter + created_at sort straight from the index
+    await db.messages.create_index([("room_id", ASCENDING), ("created_at", ASCENDING)])
+
+    # Drop the old single-field indexes so they don't take up index RAM
+    existing_indexes = await db.messages.index_information()
+    for index_name in LEGACY_MESSAGE_INDEXES:
+        if index_name in existing_indexes:
+            try:
+                await db.messages.drop_index(index_name)
+            except OperationFailure as e:
+                # Another worker dropped it first (IndexNotFound) - that's fine
+                if e.code != INDEX_NOT_FOUND:
+                    raise
 
 
 async def close_mongo_connection():
@@ -50,9 +82,56 @@ async def get_or_create_user(username: str) -> dict:
     """
     Get user by username, or create if not exists.
     This is the core user identification mechanism - no auth tokens needed.
+    Known users are served from an in-process cache; otherwise a single
+    upsert both creates and returns the user.
     """
-    user = await db.users.find_one({"username": username})
-    if user is None:
-        result = await db.users.insert_one({"username": username})
-        user = {"_id": result.inserted_id, "username": username}
+    user = _user_cache.get(username)
+    if user is not None:
+        return user
+
+    try:
+        user = await db.users.find_one_and_update(
+            {"username": username},
+            {"$setOnInsert": {"username": username}},
+            projection={"username": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Lost an upsert race with a concurrent request - the user exists now
+        user = await db.users.find_one({"username": username}, {"username": 1})
+
+    _user_cache[username] = user
     return user
+
+
+async def get_room_cached(room_oid) -> Optional[dict]:
+    """
+    Get a room's name, owner and participants, served from the in-process
+    cache when possible. Returns None if the room doesn't exist.
+    Participants are a frozenset so membership checks are O(1).
+    """
+    room = _room_cache.get(room_oid)
+    if room is None:
+        generation = _room_cache_generation
+        doc = await db.rooms.find_one(
+            {"_id": room_oid},
+            {"name": 1, "owner_username": 1, "participant_usernames": 1}
+        )
+        if doc is None:
+            return None
+        room = {
+            "name": doc["name"],
+            "owner_username": doc["owner_username"],
+            "participants": frozenset(doc["participant_usernames"])
+        }
+        if generation == _room_cache_generation:
+            _room_cache[room_oid] = room
+    return room
+
+
+def invalidate_room(room_oid):
+    """Drop a room from the in-process cache after it changes."""
+    global _room_cache_generation
+    _room_cache_generation += 1
+    _room_cache.pop(room_oid, None)
@@ -9,6 +9,7 @@ from contextlib import asynccontextmanager
 
 from app.database import connect_to_mongo, close_mongo_connection
 from app.routes import users, rooms, messages
+from app.serialization import UTCJSONResponse
 from app.sockets import sio
 
 
@@ -29,6 +30,7 @@ app = FastAPI(
     title="Chat Room API",
     description="Simple chat backend with FastAPI + Socket.IO + MongoDB",
     version="1.0.0",
+    default_response_class=UTCJSONResponse,
     lifespan=lifespan
 )
 
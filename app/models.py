@@ -4,7 +4,7 @@ Keeping it simple - minimal models that match the MongoDB schema.
 """
 
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 
 
@@ -46,18 +46,20 @@ class MessageResponse(BaseModel):
 
 
 # --- Helper functions to convert MongoDB documents ---
+# Documents come from our own collections, so the models are built with
+# model_construct() and skip field validation.
 
-def user_to_response(user: dict) -> UserResponse:
+def user_to_response(user: Dict[str, Any]) -> UserResponse:
     """Convert MongoDB user document to response model."""
-    return UserResponse(
+    return UserResponse.model_construct(
         id=str(user["_id"]),
         username=user["username"]
     )
 
 
-def room_to_response(room: dict) -> RoomResponse:
+def room_to_response(room: Dict[str, Any]) -> RoomResponse:
     """Convert MongoDB room document to response model."""
-    return RoomResponse(
+    return RoomResponse.model_construct(
         id=str(room["_id"]),
         name=room["name"],
         owner_username=room["owner_username"],
@@ -66,12 +68,44 @@ def room_to_response(room: dict) -> RoomResponse:
     )
 
 
-def message_to_response(message: dict) -> MessageResponse:
+def message_to_response(message: Dict[str, Any]) -> MessageResponse:
     """Convert MongoDB message document to response model."""
-    return MessageResponse(
+    return MessageResponse.model_construct(
         id=str(message["_id"]),
         room_id=str(message["room_id"]),
         sender_username=message["sender_username"],
         text=message["text"],
         created_at=message["created_at"]
     )
+
+
+# --- Plain dict helpers for list endpoints (serialized directly by orjson) ---
+
+def user_to_dict(user: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert MongoDB user document to a response dict."""
+    return {
+        "id": str(user["_id"]),
+        "username": user["username"]
+    }
+
+
+def room_to_dict(room: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert MongoDB room document to a response dict."""
+    return {
+        "id": str(room["_id"]),
+        "name": room["name"],
+        "owner_username": room["owner_username"],
+        "participant_usernames": room["participant_usernames"],
+        "created_at": room["created_at"]
+    }
+
+
+def message_to_dict(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert MongoDB message document to a response dict."""
+    return {
+        "id": str(message["_id"]),
+        "room_id": str(message["room_id"]),
+        "sender_username": message["sender_username"],
+        "text": message["text"],
+        "created_at": message["created_at"]
+    }
@@ -8,8 +8,9 @@ from typing import List
 from bson import ObjectId
 from fastapi import APIRouter, Header, HTTPException, Query
 
-from app.database import get_database, get_or_create_user
-from app.models import MessageResponse, message_to_response
+from app.database import get_database, get_or_create_user, get_room_cached
+from app.models import MessageResponse, message_to_dict
+from app.serialization import UTCJSONResponse
 
 router = APIRouter(prefix="/rooms", tags=["messages"])
 
@@ -40,11 +41,11 @@ async def get_messages(
     await get_or_create_user(username)
 
     # Check room exists and user is participant
-    room = await db.rooms.find_one({"_id": room_oid})
+    room = await get_room_cached(room_oid)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
 
-    if username not in room["participant_usernames"]:
+    if username not in room["participants"]:
         raise HTTPException(status_code=403, detail="Not a participant of this room")
 
     # Fetch messages sorted by time
@@ -52,7 +53,9 @@ async def get_messages(
         {"room_id": room_oid}
     ).sort("created_at", 1).limit(limit).to_list(length=limit)
 
-    return [message_to_response(msg) for msg in messages]
+    # Returning a Response directly skips response_model validation;
+    # response_model is kept for the OpenAPI schema only
+    return UTCJSONResponse([message_to_dict(msg) for msg in messages])
 
 
 @router.delete("/{room_id}/messages/{message_id}")
@@ -72,26 +75,25 @@ async def delete_message(
 
     await get_or_create_user(username)
 
-    # Check room exists
-    room = await db.rooms.find_one({"_id": room_oid})
+    # Check room exists (owner is needed for the permission filter)
+    room = await get_room_cached(room_oid)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
 
-    # Check message exists and belongs to this room
-    message = await db.messages.find_one({"_id": msg_oid, "room_id": room_oid})
-    if not message:
-        raise HTTPException(status_code=404, detail="Message not found")
-
-    # Check permission: sender or room owner
-    is_sender = message["sender_username"] == username
-    is_owner = room["owner_username"] == username
-
-    if not is_sender and not is_owner:
+    # Permission: room owner can delete any message, others only their own
+    delete_filter = {"_id": msg_oid, "room_id": room_oid}
+    if room["owner_username"] != username:
+        delete_filter["sender_username"] = username
+
+    result = await db.messages.delete_one(delete_filter)
+    if result.deleted_count == 0:
+        # Nothing deleted - tell apart a missing message from a forbidden one
+        message = await db.messages.find_one({"_id": msg_oid, "room_id": room_oid}, {"_id": 1})
+        if not message:
+            raise HTTPException(status_code=404, detail="Message not found")
         raise HTTPException(
             status_code=403,
             detail="Only message sender or room owner can delete"
         )
 
-    await db.messages.delete_one({"_id": msg_oid})
-
     return {"message": "Message deleted successfully"}
@@ -3,22 +3,29 @@ Room routes - CRUD operations for chat rooms.
 All operations use X-Username header for user identification.
 """
 
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import List
 
 from bson import ObjectId
 from fastapi import APIRouter, Header, HTTPException
+from pymongo import ReturnDocument, UpdateOne
 
-from app.database import get_database, get_or_create_user
+from app.database import get_database, get_or_create_user, invalidate_room
 from app.models import (
     RoomCreate,
     RoomUpdate,
     RoomResponse,
+    room_to_dict,
     room_to_response,
 )
+from app.serialization import UTCJSONResponse
 
 router = APIRouter(prefix="/rooms", tags=["rooms"])
 
+# Handlers return already-shaped RoomResponse models, so response_model=None
+# skips FastAPI's re-validation; the schema is still documented via responses.
+ROOM_RESPONSES = {200: {"model": RoomResponse}}
+
 
 def validate_object_id(id_str: str) -> ObjectId:
     """Validate and convert string to ObjectId."""
@@ -28,7 +35,19 @@ def validate_object_id(id_str: str) -> ObjectId:
         raise HTTPException(status_code=400, detail="Invalid room ID format")
 
 
-@router.post("", response_model=RoomResponse)
+async def raise_room_access_error(oid: ObjectId, forbidden_detail: str):
+    """
+    Raise the right error after an owner-scoped write matched nothing:
+    404 if the room doesn't exist, otherwise 403 with forbidden_detail.
+    """
+    db = get_database()
+    room = await db.rooms.find_one({"_id": oid}, {"_id": 1})
+    if not room:
+        raise HTTPException(status_code=404, detail="Room not found")
+    raise HTTPException(status_code=403, detail=forbidden_detail)
+
+
+@router.post("", response_model=None, responses=ROOM_RESPONSES)
 async def create_room(
     room_data: RoomCreate,
     x_username: str = Header(..., alias="X-Username")
@@ -44,29 +63,34 @@ async def create_room(
     # Ensure owner user exists
     await get_or_create_user(username)
 
-    # Start with owner in participants
-    participants = [username]
-
-    # Validate and add other participants if provided
-    if room_data.participant_usernames:
-        for participant in room_data.participant_usernames:
-            participant = participant.strip()
-            if participant and participant != username:
-                # Check if user exists
-                existing = await db.users.find_one({"username": participant})
-                if not existing:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"User '{participant}' does not exist"
-                    )
-                if participant not in participants:
-                    participants.append(participant)
+    # Dedup other participants, keeping request order
+    others = list(dict.fromkeys(
+        p.strip() for p in room_data.participant_usernames
+        if p.strip() and p.strip() != username
+    ))
+
+    # Validate all other participants exist in a single query
+    if others:
+        existing = await db.users.find(
+            {"username": {"$in": others}}, {"username": 1}
+        ).to_list(length=len(others))
+        existing_usernames = {user["username"] for user in existing}
+        missing = [p for p in others if p not in existing_usernames]
+        if missing:
+            raise HTTPException(
+                status_code=400,
+                detail=f"User '{missing[0]}' does not exist" if len(missing) == 1
+                else "Users " + ", ".join(f"'{p}'" for p in missing) + " do not exist"
+            )
+
+    # Owner always comes first in participants
+    participants = [username] + others
 
     room_doc = {
         "name": room_data.name,
         "owner_username": username,
         "participant_usernames": participants,
-        "created_at": datetime.utcnow()
+        "created_at": datetime.now(timezone.utc)
     }
 
     result = await db.rooms.insert_one(room_doc)
@@ -89,10 +113,10 @@ async def get_my_rooms(x_username: str = Header(..., alias="X-Username")):
         {"participant_usernames": username}
     ).to_list(length=100)
 
-    return [room_to_response(room) for room in rooms]
+    return UTCJSONResponse([room_to_dict(room) for room in rooms])
 
 
-@router.get("/{room_id}", response_model=RoomResponse)
+@router.get("/{room_id}", response_model=None, responses=ROOM_RESPONSES)
 async def get_room(
     room_id: str,
     x_username: str = Header(..., alias="X-Username")
@@ -117,7 +141,7 @@ async def get_room(
     return room_to_response(room)
 
 
-@router.patch("/{room_id}", response_model=RoomResponse)
+@router.patch("/{room_id}", response_model=None, responses=ROOM_RESPONSES)
 async def update_room(
     room_id: str,
     room_update: RoomUpdate,
@@ -133,7 +157,7 @@ async def update_room(
 
     await get_or_create_user(username)
 
-    room = await db.rooms.find_one({"_id": oid})
+    room = await db.rooms.find_one({"_id": oid}, {"owner_username": 1})
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
 
@@ -145,17 +169,30 @@ async def update_room(
     if room_update.name is not None:
         update_doc["name"] = room_update.name
     if room_update.participant_usernames is not None:
-        # Ensure owner stays in participants
-        participants = list(set(room_update.participant_usernames))
+        # Ordered dedup (single pass), then ensure owner stays in participants
+        participants = list(dict.fromkeys(
+            p.strip() for p in room_update.participant_usernames if p.strip()
+        ))
         if username not in participants:
             participants.append(username)
-        # Auto-create new participants
-        for participant in participants:
-            await get_or_create_user(participant)
+        # Auto-create new participants in one round trip
+        await db.users.bulk_write(
+            [
+                UpdateOne({"username": p}, {"$setOnInsert": {"username": p}}, upsert=True)
+                for p in participants
+            ],
+            ordered=False
+        )
         update_doc["participant_usernames"] = participants
 
     if update_doc:
-        await db.rooms.update_one({"_id": oid}, {"$set": update_doc})
+        room = await db.rooms.find_one_and_update(
+            {"_id": oid},
+            {"$set": update_doc},
+            return_document=ReturnDocument.AFTER
+        )
+        invalidate_room(oid)
+    else:
         room = await db.rooms.find_one({"_id": oid})
 
     return room_to_response(room)
@@ -176,23 +213,19 @@ async def delete_room(
 
     await get_or_create_user(username)
 
-    room = await db.rooms.find_one({"_id": oid})
-    if not room:
-        raise HTTPException(status_code=404, detail="Room not found")
-
-    if room["owner_username"] != username:
-        raise HTTPException(status_code=403, detail="Only owner can delete room")
+    # Delete the room only if the caller owns it
+    result = await db.rooms.delete_one({"_id": oid, "owner_username": username})
+    if result.deleted_count == 0:
+        await raise_room_access_error(oid, "Only owner can delete room")
+    invalidate_room(oid)
 
     # Delete all messages in the room
     await db.messages.delete_many({"room_id": oid})
 
-    # Delete the room
-    await db.rooms.delete_one({"_id": oid})
-
     return {"message": "Room deleted successfully"}
 
 
-@router.post("/{room_id}/participants/{participant_username}", response_model=RoomResponse)
+@router.post("/{room_id}/participants/{participant_username}", response_model=None, responses=ROOM_RESPONSES)
 async def add_participant(
     room_id: str,
     participant_username: str,
@@ -210,30 +243,25 @@ async def add_participant(
 
     await get_or_create_user(username)
 
-    room = await db.rooms.find_one({"_id": oid})
-    if not room:
-        raise HTTPException(status_code=404, detail="Room not found")
-
-    if room["owner_username"] != username:
-        raise HTTPException(status_code=403, detail="Only owner can add participants")
-
     # Check participant exists
-    existing = await db.users.find_one({"username": participant_username})
+    existing = await db.users.find_one({"username": participant_username}, {"_id": 1})
     if not existing:
         raise HTTPException(status_code=400, detail=f"User '{participant_username}' does not exist")
 
-    # Add if not already in
-    if participant_username not in room["participant_usernames"]:
-        await db.rooms.update_one(
-            {"_id": oid},
-            {"$push": {"participant_usernames": participant_username}}
-        )
-        room = await db.rooms.find_one({"_id": oid})
+    # Add (idempotently) and return the updated room in one round trip
+    room = await db.rooms.find_one_and_update(
+        {"_id": oid, "owner_username": username},
+        {"$addToSet": {"participant_usernames": participant_username}},
+        return_document=ReturnDocument.AFTER
+    )
+    if room is None:
+        await raise_room_access_error(oid, "Only owner can add participants")
+    invalidate_room(oid)
 
     return room_to_response(room)
 
 
-@router.delete("/{room_id}/participants/{participant_username}", response_model=RoomResponse)
+@router.delete("/{room_id}/participants/{participant_username}", response_model=None, responses=ROOM_RESPONSES)
 async def remove_participant(
     room_id: str,
     participant_username: str,
@@ -251,22 +279,20 @@ async def remove_participant(
 
     await get_or_create_user(username)
 
-    room = await db.rooms.find_one({"_id": oid})
-    if not room:
-        raise HTTPException(status_code=404, detail="Room not found")
-
-    if room["owner_username"] != username:
-        raise HTTPException(status_code=403, detail="Only owner can remove participants")
-
-    if participant_username == room["owner_username"]:
-        raise HTTPException(status_code=400, detail="Cannot remove owner from room")
-
-    # Remove if present
-    if participant_username in room["participant_usernames"]:
-        await db.rooms.update_one(
-            {"_id": oid},
-            {"$pull": {"participant_usernames": participant_username}}
-        )
-        room = await db.rooms.find_one({"_id": oid})
+    # Only the owner may remove, and the owner can't remove themselves
+    if participant_username == username:
+        room = await db.rooms.find_one({"_id": oid}, {"owner_username": 1})
+        if room and room["owner_username"] == username:
+            raise HTTPException(status_code=400, detail="Cannot remove owner from room")
+
+    # Remove (no-op if absent) and return the updated room in one round trip
+    room = await db.rooms.find_one_and_update(
+        {"_id": oid, "owner_username": username},
+        {"$pull": {"participant_usernames": participant_username}},
+        return_document=ReturnDocument.AFTER
+    )
+    if room is None:
+        await raise_room_access_error(oid, "Only owner can remove participants")
+    invalidate_room(oid)
 
     return room_to_response(room)
@@ -5,25 +5,31 @@ Authentication is just X-Username header, auto-creates users.
 
 from typing import List
 
-from fastapi import APIRouter, Header, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Query
 
 from app.database import get_database, get_or_create_user
-from app.models import UserResponse, user_to_response
+from app.models import UserResponse, user_to_dict, user_to_response
+from app.serialization import UTCJSONResponse
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 
 @router.get("", response_model=List[UserResponse])
-async def get_users():
+async def get_users(
+    skip: int = Query(default=0, ge=0),
+    limit: int = Query(default=1000, ge=1, le=1000)
+):
     """
-    Get all users in the system.
+    Get users in the system, paginated with skip/limit.
     """
     db = get_database()
-    users = await db.users.find().to_list(length=1000)
-    return [user_to_response(user) for user in users]
+    users = await db.users.find(
+        {}, {"username": 1}
+    ).sort("_id", 1).skip(skip).limit(limit).to_list(length=limit)
+    return UTCJSONResponse([user_to_dict(user) for user in users])
 
 
-@router.get("/me", response_model=UserResponse)
+@router.get("/me", response_model=None, responses={200: {"model": UserResponse}})
 async def get_me(x_username: str = Header(..., alias="X-Username")):
     """
     Get the current user's info.
@@ -0,0 +1,44 @@
+"""
+JSON encoding shared by the HTTP routes and the Socket.IO server.
+Datetimes stay native datetime objects all the way to the edge, where orjson
+encodes them once as UTC with a "Z" suffix (e.g. 2025-12-02T10:00:00Z).
+"""
+
+from datetime import datetime, timezone
+
+import orjson
+from fastapi.responses import JSONResponse
+
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NAIVE_UTC
+
+
+class UTCJSONResponse(JSONResponse):
+    """JSON response rendered by orjson, with datetimes as UTC with a "Z" suffix."""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=ORJSON_OPTIONS | orjson.OPT_NON_STR_KEYS)
+
+
+class SocketJSON:
+    """
+    orjson-backed stand-in for the json module used by python-socketio
+    and python-engineio (only dumps/loads are needed).
+    """
+
+    @staticmethod
+    def dumps(obj, **kwargs) -> str:
+        # kwargs such as separators=... are ignored; orjson output is compact
+        return orjson.dumps(obj, option=ORJSON_OPTIONS).decode()
+
+    @staticmethod
+    def loads(data, **kwargs):
+        return orjson.loads(data)
+
+
+def msgpack_default(obj):
+    """Encode datetimes for the msgpack Socket.IO serializer."""
+    if isinstance(obj, datetime):
+        if obj.tzinfo is None:
+            obj = obj.replace(tzinfo=timezone.utc)
+        return obj.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
@@ -3,18 +3,20 @@ Socket.IO event handlers for real-time messaging.
 Handles: connect, disconnect, join_room, send_message
 """
 
-import json
+import asyncio
 import os
 import re
-from datetime import datetime
+from datetime import datetime, timezone
 from urllib.parse import parse_qs
 
 import google.generativeai as genai
+import orjson
 import socketio
 from bson import ObjectId
 from dotenv import load_dotenv
 
-from app.database import get_database, get_or_create_user
+from app.database import get_database, get_or_create_user, get_room_cached
+from app.serialization import SocketJSON, msgpack_default
 
 # Load environment variables
 load_dotenv()
@@ -23,11 +25,19 @@ load_dotenv()
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 gemini_model = genai.GenerativeModel("gemini-2.5-flash")
 
+# @AI mention: trigger checked case-insensitively, stripped from the prompt
+AI_TRIGGER = "@ai"
+AI_MENTION_RE = re.compile(r'@AI\s*', re.IGNORECASE)
 
-async def get_ai_response(room_name: str, user_message: str) -> str:
-    """Call Gemini to get AI response."""
+
+async def get_ai_response(room_name: str, user_message: str, on_chunk=None) -> str:
+    """
+    Call Gemini to get AI response.
+    Streams the reply through the async client so the event loop isn't
+    blocked; each partial chunk is passed to the optional on_chunk coroutine.
+    """
     # Remove @AI from the message
-    query = re.sub(r'@AI\s*', '', user_message, flags=re.IGNORECASE).strip()
+    query = AI_MENTION_RE.sub('', user_message).strip()
 
     prompt = f"""You are a helpful AI assistant in a chat room called "{room_name}".
 A user is asking: {query}
@@ -35,21 +45,142 @@ A user is asking: {query}
 Give a concise, helpful response. Keep it brief and to the point."""
 
     try:
-        response = gemini_model.generate_content(prompt)
-        return response.text.strip()
+        response = await gemini_model.generate_content_async(prompt, stream=True)
+        parts = []
+        async for chunk in response:
+            # chunk.text raises ValueError for chunks without parts, e.g. the
+            # trailing chunk that only carries finish_reason - skip those
+            try:
+                chunk_text = chunk.text
+            except ValueError:
+                continue
+            if not chunk_text:
+                continue
+            parts.append(chunk_text)
+            if on_chunk is not None:
+                await on_chunk(chunk_text)
+        reply = "".join(parts).strip()
+        if not reply:
+            return "Sorry, I couldn't process that request."
+        return reply
     except Exception as e:
         print(f"Gemini error: {e}")
         return "Sorry, I couldn't process that request."
 
 
+def get_socketio_serializer():
+    """
+    Pick the Socket.IO packet serializer from SOCKETIO_SERIALIZER.
+    "msgpack" switches to the binary msgpack codec (needs the msgpack package,
+    and clients must use socket.io-msgpack-parser); the default stays JSON so
+    existing clients keep working.
+    """
+    if os.getenv("SOCKETIO_SERIALIZER") == "msgpack":
+        from socketio.msgpack_packet import MsgPackPacket
+        return MsgPackPacket.configure(dumps_default=msgpack_default)
+    return "default"
+
+
 # Create Socket.IO server (async mode for use with FastAPI/ASGI)
+# JSON framing goes through orjson, which also encodes datetimes in payloads.
 sio = socketio.AsyncServer(
     async_mode="asgi",
-    cors_allowed_origins="*"  # For development; tighten in production
+    cors_allowed_origins="*",  # For development; tighten in production
+    serializer=get_socketio_serializer(),
+    json=SocketJSON,
+    compression_threshold=512  # Compress polling payloads above 512 bytes
 )
 
-# In-memory mapping of socket session ID to username
-sid_to_username: dict[str, str] = {}
+# In-memory per-connection state, keyed by socket session ID:
+# {"username": ..., "rooms": {room_id: ObjectId(room_id)}} where "rooms" holds
+# the rooms this socket has joined, with the room_id already parsed.
+sid_state: dict[str, dict] = {}
+
+# Broadcast coalescing: the first message in a room goes out immediately as
+# "new_message"; messages arriving within the next flush window are buffered
+# and sent together as one "new_messages" list event.
+EMIT_FLUSH_INTERVAL_SECONDS = 0.02
+MAX_MESSAGES_PER_FRAME = 16
+pending_messages: dict[str, list[dict]] = {}
+_flush_task: asyncio.Task | None = None
+
+# Strong references to fire-and-forget tasks (asyncio only keeps weak ones)
+background_tasks: set[asyncio.Task] = set()
+
+
+async def _flush_pending_messages():
+    """Periodically flush buffered messages until no room has an open window."""
+    while pending_messages:
+        await asyncio.sleep(EMIT_FLUSH_INTERVAL_SECONDS)
+        for room_id in list(pending_messages):
+            buffered = pending_messages.pop(room_id)
+            if buffered:
+                await sio.emit("new_messages", buffered, room=room_id)
+
+
+async def broadcast_message(room_id: str, message: dict):
+    """Broadcast a message to a room, coalescing bursts into batched emits."""
+    global _flush_task
+
+    buffered = pending_messages.get(room_id)
+    if buffered is None:
+        # Fast path: nothing recent in this room, send now and open a window
+        pending_messages[room_id] = []
+        if _flush_task is None or _flush_task.done():
+            _flush_task = asyncio.create_task(_flush_pending_messages())
+        await sio.emit("new_message", message, room=room_id)
+        return
+
+    buffered.append(message)
+    if len(buffered) >= MAX_MESSAGES_PER_FRAME:
+        pending_messages[room_id] = []
+        await sio.emit("new_messages", buffered, room=room_id)
+
+
+async def handle_ai_message(room_oid: ObjectId, room_id: str, room_name: str, text: str):
+    """
+    Generate, store and broadcast the AI reply to an @AI message.
+    Runs as a background task so send_message returns without waiting on
+    Gemini; failures are logged instead of propagating.
+    """
+    db = get_database()
+    try:
+        # Id is assigned up front so streamed chunks and the final message match
+        ai_oid = ObjectId()
+
+        async def emit_chunk(chunk_text: str):
+            await sio.emit("new_message_chunk", {
+                "id": str(ai_oid),
+                "room_id": room_id,
+                "sender_username": "AI",
+                "text": chunk_text
+            }, room=room_id)
+
+        ai_response_text = await get_ai_response(room_name, text, on_chunk=emit_chunk)
+
+        # Save AI message to database
+        ai_now = datetime.now(timezone.utc)
+        ai_message_doc = {
+            "_id": ai_oid,
+            "room_id": room_oid,
+            "sender_username": "AI",
+            "text": ai_response_text,
+            "created_at": ai_now
+        }
+        await db.messages.insert_one(ai_message_doc)
+
+        # Broadcast full AI response to room
+        ai_message_response = {
+            "id": str(ai_oid),
+            "room_id": room_id,
+            "sender_username": "AI",
+            "text": ai_response_text,
+            "created_at": ai_now
+        }
+        await broadcast_message(room_id, ai_message_response)
+        print(f"AI responded in room {room_id}")
+    except Exception as e:
+        print(f"AI handling failed in room {room_id}: {e}")
 
 
 def get_username_from_query(environ: dict) -> str | None:
@@ -78,8 +209,8 @@ async def connect(sid, environ, auth=None):
     # Get or create user in database
     await get_or_create_user(username)
 
-    # Store mapping
-    sid_to_username[sid] = username
+    # Store connection state
+    sid_state[sid] = {"username": username, "rooms": {}}
     print(f"User '{username}' connected with sid {sid}")
 
     return True
@@ -88,7 +219,8 @@ async def connect(sid, environ, auth=None):
 @sio.event
 async def disconnect(sid):
     """Handle Socket.IO disconnection."""
-    username = sid_to_username.pop(sid, None)
+    state = sid_state.pop(sid, None)
+    username = state["username"] if state else None
     print(f"User '{username}' disconnected (sid {sid})")
 
 
@@ -101,18 +233,17 @@ async def join_room(sid, data):
     """
 
     # Parse JSON string to dict
-    if isinstance(data, str):
+    if isinstance(data, (str, bytes)):
         try:
-            data = json.loads(data)
-        except json.JSONDecodeError:
+            data = orjson.loads(data)
+        except orjson.JSONDecodeError:
             data = {}
 
     room_id = data.get("room_id") if isinstance(data, dict) else None
 
-    db = get_database()
-    username = sid_to_username.get(sid)
+    state = sid_state.get(sid)
 
-    if not username:
+    if not state:
         await sio.emit("error", {"message": "Not authenticated"}, to=sid)
         return
     if not room_id:
@@ -126,17 +257,19 @@ async def join_room(sid, data):
         return
 
     # Check room exists and user is participant
-    room = await db.rooms.find_one({"_id": room_oid})
+    room = await get_room_cached(room_oid)
     if not room:
         await sio.emit("error", {"message": "Room not found"}, to=sid)
         return
 
-    if username not in room["participant_usernames"]:
+    username = state["username"]
+    if username not in room["participants"]:
         await sio.emit("error", {"message": "Not a participant of this room"}, to=sid)
         return
 
-    # Join the Socket.IO room
+    # Join the Socket.IO room and remember the parsed room ID for send_message
     await sio.enter_room(sid, room_id)
+    state["rooms"][room_id] = room_oid
     print(f"User '{username}' joined room {room_id}")
 
     # Notify the user they successfully joined
@@ -150,16 +283,16 @@ async def leave_room(sid, data):
     Payload: {"room_id": "..."}
     """
     # Parse JSON string to dict
-    if isinstance(data, str):
+    if isinstance(data, (str, bytes)):
         try:
-            data = json.loads(data)
-        except json.JSONDecodeError:
+            data = orjson.loads(data)
+        except orjson.JSONDecodeError:
             data = {}
 
     room_id = data.get("room_id") if isinstance(data, dict) else None
-    username = sid_to_username.get(sid)
+    state = sid_state.get(sid)
 
-    if not username:
+    if not state:
         await sio.emit("error", {"message": "Not authenticated"}, to=sid)
         return
     if not room_id:
@@ -168,6 +301,8 @@ async def leave_room(sid, data):
 
     # Leave the Socket.IO room
     await sio.leave_room(sid, room_id)
+    state["rooms"].pop(room_id, None)
+    username = state["username"]
     print(f"User '{username}' left room {room_id}")
 
     # Notify the user they successfully left
@@ -182,19 +317,19 @@ async def send_message(sid, data):
     Creates message in DB and broadcasts to all room participants.
     """
     # Parse JSON string to dict
-    if isinstance(data, str):
+    if isinstance(data, (str, bytes)):
         try:
-            data = json.loads(data)
-        except json.JSONDecodeError:
+            data = orjson.loads(data)
+        except orjson.JSONDecodeError:
             data = {}
 
     room_id = data.get("room_id") if isinstance(data, dict) else None
     text = (data.get("text", "") if isinstance(data, dict) else "").strip()
 
     db = get_database()
-    username = sid_to_username.get(sid)
+    state = sid_state.get(sid)
 
-    if not username:
+    if not state:
         await sio.emit("error", {"message": "Not authenticated"}, to=sid)
         return
 
@@ -206,24 +341,25 @@ async def send_message(sid, data):
         await sio.emit("error", {"message": "text cannot be empty"}, to=sid)
         return
 
-    try:
-        room_oid = ObjectId(room_id)
-    except Exception:
-        await sio.emit("error", {"message": "Invalid room_id format"}, to=sid)
+    # Must have joined the room first; reuses the ObjectId parsed in join_room
+    room_oid = state["rooms"].get(room_id)
+    if room_oid is None:
+        await sio.emit("error", {"message": "Join the room before sending messages"}, to=sid)
         return
 
     # Check room exists and user is participant
-    room = await db.rooms.find_one({"_id": room_oid})
+    room = await get_room_cached(room_oid)
     if not room:
         await sio.emit("error", {"message": "Room not found"}, to=sid)
         return
 
-    if username not in room["participant_usernames"]:
+    username = state["username"]
+    if username not in room["participants"]:
         await sio.emit("error", {"message": "Not a participant of this room"}, to=sid)
         return
 
     # Create message document
-    now = datetime.utcnow()
+    now = datetime.now(timezone.utc)
     message_doc = {
         "room_id": room_oid,
         "sender_username": username,
@@ -233,41 +369,22 @@ async def send_message(sid, data):
 
     result = await db.messages.insert_one(message_doc)
 
-    # Prepare response message (with string IDs for JSON serialization)
+    # Prepare response message (string IDs; created_at is encoded at the edge)
     message_response = {
         "id": str(result.inserted_id),
         "room_id": room_id,
         "sender_username": username,
         "text": text,
-        "created_at": now.isoformat()
+        "created_at": now
     }
 
     # Broadcast to all users in the room
-    await sio.emit("new_message", message_response, room=room_id)
+    await broadcast_message(room_id, message_response)
     print(f"Message from '{username}' in room {room_id}: {text[:50]}...")
 
     # Check if message contains @AI - trigger AI response
-    if "@ai" in text.lower():
-        room_name = room["name"]
-        ai_response_text = await get_ai_response(room_name, text)
-
-        # Save AI message to database
-        ai_now = datetime.utcnow()
-        ai_message_doc = {
-            "room_id": room_oid,
-            "sender_username": "AI",
-            "text": ai_response_text,
-            "created_at": ai_now
-        }
-        ai_result = await db.messages.insert_one(ai_message_doc)
-
-        # Broadcast AI response to room
-        ai_message_response = {
-            "id": str(ai_result.inserted_id),
-            "room_id": room_id,
-            "sender_username": "AI",
-            "text": ai_response_text,
-            "created_at": ai_now.isoformat()
-        }
-        await sio.emit("new_message", ai_message_response, room=room_id)
-        print(f"AI responded in room {room_id}")
+    # (cheap "@" check first so most messages skip the lowercase copy)
+    if "@" in text and AI_TRIGGER in text.lower():
+        task = asyncio.create_task(handle_ai_message(room_oid, room_id, room["name"], text))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)